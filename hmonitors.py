@@ -6,18 +6,49 @@ __license__ = "MIT"
 
 import subprocess
 import traceback
+import ctypes.util
 import argparse
 import logging
 import asyncio
+import hashlib
 import shutil
 import signal
-import shlex
+import struct
+import select
+import socket
 import yaml
 import json
 import time
 import sys
 import os
 
+from collections import deque
+
+# orjson is optional, it parses the output of hyprctl faster than json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+# Parsed configuration files, keyed by path: path -> (mtime_ns, size, digest, config)
+_CONFIG_CACHE = {}
+
+# Use the libyaml C loader when PyYAML has been built with it
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# Monitors reported by hyprctl and configuration of the last applied setup
+_LAST_TOPOLOGY = None
+_LAST_CONFIG = None
+
+# Path of notify-send, None if it is not installed
+_NOTIFY_SEND = shutil.which('notify-send')
+
+# Properties of the hyprctl monitors that identify the connected monitors,
+# in addition to the properties used by the match lists of the configuration
+TOPOLOGY_KEYS = ('name', 'description', 'make', 'model', 'serial', 'width', 'height')
+
 
 class EventListener:
     '''
@@ -28,20 +59,115 @@ class EventListener:
 
     Class to listen to events from hyprland
     The events are received from a unix socket
+    The socket is read directly into a reusable buffer,
+    without going through an asyncio stream
+    The events are yielded as raw bytes, in the format EVENT>>DATA
     '''
     async def start(self):
-        reader, _ = await asyncio.open_unix_connection(f'{os.getenv('XDG_RUNTIME_DIR')}/hypr/{os.getenv('HYPRLAND_INSTANCE_SIGNATURE')}/.socket2.sock')
-        yield 'connect'
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM | socket.SOCK_NONBLOCK)
+        try:
+            await loop.sock_connect(sock, f'{os.getenv('XDG_RUNTIME_DIR')}/hypr/{os.getenv('HYPRLAND_INSTANCE_SIGNATURE')}/.socket2.sock')
+            yield b'connect'
+
+            # Events are received into a reusable buffer: data between read_pos and
+            # write_pos has been received but not yet split into lines
+            buffer = bytearray(65536)
+            view = memoryview(buffer)
+            read_pos = write_pos = 0
+            while True:
+                if write_pos == len(buffer):
+                    if read_pos == 0:
+                        # A single event does not fit in the buffer
+                        view.release()
+                        buffer.extend(bytes(len(buffer)))
+                        view = memoryview(buffer)
+                    else:
+                        # Move the partial event at the end to the start of the buffer
+                        buffer[:write_pos - read_pos] = buffer[read_pos:write_pos]
+                        write_pos -= read_pos
+                        read_pos = 0
+
+                received = await loop.sock_recv_into(sock, view[write_pos:])
+                if not received:
+                    break
+                write_pos += received
+
+                while True:
+                    end = buffer.find(b'\n', read_pos, write_pos)
+                    if end == -1:
+                        break
+                    data = bytes(view[read_pos:end])
+                    read_pos = end + 1
+                    yield data
+
+                if read_pos == write_pos:
+                    read_pos = write_pos = 0
+        finally:
+            sock.close()
+
+class FileWatcher:
+    '''
+    Class to watch a file for changes using inotify
+    The parent directory is watched instead of the file itself,
+    so that editors replacing the file with a rename are also detected
+    If the file is a symlink, the directory of its target is watched as well
+    The events are read from the inotify file descriptor
+    without polling, using the asyncio event loop
+    '''
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO    = 0x00000080
+    EVENT_HEADER   = struct.Struct('iIII')
 
-        buffer = b''
-        while True:
-            new_data = await reader.read(8192)
-            if not new_data:
-                break
-            buffer += new_data
-            while b'\n' in buffer:
-                data, buffer = buffer.split(b'\n', 1)
-                yield data.decode('utf-8')
+    def __init__(self, path):
+        self.directory, self.filename = os.path.split(os.path.abspath(path))
+        # Names of the watched files in each watched directory
+        self.watched = {self.directory: {self.filename}}
+        target_directory, target_filename = os.path.split(os.path.realpath(path))
+        self.watched.setdefault(target_directory, set()).add(target_filename)
+
+    async def start(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        try:
+            # Watched file names, by watch descriptor
+            filenames = {}
+            for directory, names in self.watched.items():
+                wd = libc.inotify_add_watch(fd, os.fsencode(directory), self.IN_CLOSE_WRITE | self.IN_MOVED_TO)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {directory}')
+                filenames[wd] = names
+
+            loop = asyncio.get_running_loop()
+            readable = asyncio.Event()
+            loop.add_reader(fd, readable.set)
+            try:
+                while True:
+                    await readable.wait()
+                    readable.clear()
+                    try:
+                        data = os.read(fd, 4096)
+                    except BlockingIOError:
+                        continue
+
+                    changed = False
+                    offset = 0
+                    while offset < len(data):
+                        wd, _, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                        offset += self.EVENT_HEADER.size
+                        name = data[offset:offset + length].rstrip(b'\0')
+                        offset += length
+                        if os.fsdecode(name) in filenames.get(wd, ()):
+                            changed = True
+                    if changed:
+                        yield self.filename
+            finally:
+                loop.remove_reader(fd)
+        finally:
+            os.close(fd)
 
 class Monitor:
     '''
@@ -55,13 +181,18 @@ class Monitor:
     def __init__(self, id, name):
         self.id     = id
         self.name   = name
-        # above, below, left, right are the name of the monitors that are positioned relative to this monitor
+        # above, below, left, right are the indices, in the list of monitors,
+        # of the monitors that are positioned relative to this monitor
         self.above  = None
         self.below  = None
         self.left   = None
         self.right  = None
         self.resolution = None
         self.position = None
+        # _res and _pos are the resolution and position as (width, height) and (x, y) tuples of ints
+        # They are None when the resolution or position is a keyword, such as 'preferred' or 'auto'
+        self._res = None
+        self._pos = None
         self.align = 'center'
         self.scale  = 1
         self.extra  = None
@@ -69,8 +200,8 @@ class Monitor:
     def set_above(self, above):
         '''
         Set the monitor above this monitor
-        :param above: monitor above this monitor
-        :type above: str
+        :param above: index of the monitor above this monitor
+        :type above: int
         :return: None
         '''
         self.above = above
@@ -78,8 +209,8 @@ class Monitor:
     def set_below(self, below):
         '''
         Set the monitor below this monitor
-        :param below: monitor below this monitor
-        :type below: str
+        :param below: index of the monitor below this monitor
+        :type below: int
         :return: None
         '''
         self.below = below
@@ -87,8 +218,8 @@ class Monitor:
     def set_left(self, left):
         '''
         Set the monitor to the left of this monitor
-        :param left: monitor to the left of this monitor
-        :type left: str
+        :param left: index of the monitor to the left of this monitor
+        :type left: int
         :return: None
         '''
         self.left = left
@@ -96,8 +227,8 @@ class Monitor:
     def set_right(self, right):
         '''
         Set the monitor to the right of this monitor
-        :param right: monitor to the right of this monitor
-        :type right: str
+        :param right: index of the monitor to the right of this monitor
+        :type right: int
         :return: None
         '''
         self.right = right
@@ -105,20 +236,30 @@ class Monitor:
     def set_resolution(self, resolution):
         '''
         Set the resolution of the monitor
-        :param resolution: resolution of the monitor
-        :type resolution: str
+        :param resolution: resolution of the monitor as a (width, height) tuple or a keyword
+        :type resolution: tuple or str
         :return: None
         '''
-        self.resolution = resolution
+        if isinstance(resolution, tuple):
+            self._res = resolution
+            self.resolution = f'{resolution[0]}x{resolution[1]}'
+        else:
+            self._res = None
+            self.resolution = resolution
 
     def set_position(self, position):
         '''
         Set the position of the monitor
-        :param position: position of the monitor in format "XxY"
-        :type position: str
+        :param position: position of the monitor as an (x, y) tuple or a keyword
+        :type position: tuple or str
         :return: None
         '''
-        self.position = position
+        if isinstance(position, tuple):
+            self._pos = position
+            self.position = f'{position[0]}x{position[1]}'
+        else:
+            self._pos = None
+            self.position = position
 
     def set_align(self, align):
         '''
@@ -150,36 +291,105 @@ class Monitor:
         '''
         self.extra = extra
 
-    def __str__(self):
+    def describe(self, monitors):
+        '''
+        Describe the monitor, with the names of the adjacent monitors
+        :param monitors: list of monitors the adjacent monitors refer to
+        :type monitors: list
+        :return: description of the monitor
+        :rtype: str
+        '''
         monitor_str = f'Monitor {self.name} ({self.id})\n'
         monitor_str += f'  Resolution: {self.resolution}\n'
         monitor_str += f'  Scale: {self.scale}\n'
         monitor_str += f'  Position: {self.position}\n'
-        if self.above:
-            monitor_str += f'  Above: {self.above}\n'
-        if self.below:
-            monitor_str += f'  Below: {self.below}\n'
-        if self.left:
-            monitor_str += f'  Left: {self.left}\n'
-        if self.right:
-            monitor_str += f'  Right: {self.right}\n'
+        if self.above is not None:
+            monitor_str += f'  Above: {monitors[self.above].name}\n'
+        if self.below is not None:
+            monitor_str += f'  Below: {monitors[self.below].name}\n'
+        if self.left is not None:
+            monitor_str += f'  Left: {monitors[self.left].name}\n'
+        if self.right is not None:
+            monitor_str += f'  Right: {monitors[self.right].name}\n'
         if self.align:
             monitor_str += f'  Align: {self.align}\n'
         return monitor_str
 
-def get_monitors():
+# Relations of the position option, with the setters that link
+# the monitor to the relative monitor and the relative monitor to the monitor
+RELATIONS = {
+    'above':    (Monitor.set_below, Monitor.set_above),
+    'below':    (Monitor.set_above, Monitor.set_below),
+    'left-of':  (Monitor.set_right, Monitor.set_left),
+    'right-of': (Monitor.set_left, Monitor.set_right),
+}
+
+async def get_monitors():
     '''
-    Get the monitors from hyprctl
+    Get the monitors from hyprctl without blocking the event loop
     :return: list of monitors
     '''
-    result = subprocess.run(['hyprctl', 'monitors', 'all', '-j'], capture_output=True, text=True)
-    return json.loads(result.stdout)
+    process = await asyncio.create_subprocess_exec('hyprctl', 'monitors', 'all', '-j', stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    stdout, _ = await process.communicate()
+    return _json_loads(stdout)
+
+def find_existing_instances(script_name):
+    '''
+    Find other running instances of this script (exclude current PID)
+    by scanning the command lines of the processes in /proc
+    :param script_name: name of the script to look for in the command lines
+    :type script_name: str
+    :return: PIDs of the processes whose command line contains the script name
+    :rtype: list
+    '''
+    needle = os.fsencode(script_name)
+    current = os.getpid()
+    # Reused for every process, only the beginning of long command lines is checked
+    buffer = bytearray(4096)
+    pids = []
+
+    with os.scandir('/proc') as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            pid = int(entry.name)
+            if pid == current:
+                continue
+            try:
+                fd = os.open(f'/proc/{pid}/cmdline', os.O_RDONLY)
+            except OSError:
+                # The process exited or is not accessible
+                continue
+            try:
+                length = os.readv(fd, [buffer])
+            except OSError:
+                continue
+            finally:
+                os.close(fd)
+            if buffer.find(needle, 0, length) == -1:
+                continue
+
+            # Skip the children of this process: until they exec, processes
+            # being spawned (e.g. hyprctl) still have the command line of this script
+            try:
+                with open(f'/proc/{pid}/stat', 'rb') as stat:
+                    # The parent PID is the second field after the command name in parentheses
+                    parent = int(stat.read().rsplit(b')', 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            if parent == current:
+                continue
+
+            pids.append(pid)
+
+    return pids
 
 def kill_existing_instances():
     '''
     Kill other running instances of this script (exclude current PID).
-    Uses pgrep -f to find processes whose command line contains the script name,
-    sends SIGTERM, waits briefly, then SIGKILL for any remaining PIDs.
+    Scans /proc to find processes whose command line contains the script name,
+    sends SIGTERM through pidfds, waits up to 3 seconds for them to exit,
+    then SIGKILL for any remaining PIDs.
     '''
     try:
         script_name = os.path.basename(__file__)
@@ -187,59 +397,89 @@ def kill_existing_instances():
         script_name = 'hmonitors.py'
 
     try:
-        p = subprocess.run(['pgrep', '-f', script_name], capture_output=True, text=True)
-        if p.returncode != 0 or not p.stdout:
-            return
-        pids = [int(x) for x in p.stdout.split()]
+        pids = find_existing_instances(script_name)
     except Exception:
         logging.debug('Could not query running processes to kill existing instances')
         return
+    if not pids:
+        return
 
-    current = os.getpid()
-    # Send SIGTERM
+    # Open a pidfd for each instance: signals cannot reach a recycled PID
+    # and the exit of the processes is notified without polling
+    pidfds = {}
     for pid in pids:
-        if pid == current:
-            continue
         try:
-            logging.debug(f'Sending SIGTERM to existing hmonitors instance {pid}')
-            os.kill(pid, signal.SIGTERM)
+            pidfds[os.pidfd_open(pid)] = pid
         except ProcessLookupError:
             continue
         except Exception:
-            logging.debug(f'Failed to send SIGTERM to {pid}')
+            logging.debug(f'Failed to open pidfd for {pid}')
 
-    # Wait for processes to exit, then SIGKILL any remaining
-    for _ in range(6):
-        alive = []
-        for pid in pids:
-            if pid == current:
-                continue
+    poller = select.epoll()
+    try:
+        # Send SIGTERM
+        for pidfd, pid in list(pidfds.items()):
             try:
-                os.kill(pid, 0)
-                alive.append(pid)
-            except OSError:
-                pass
-        if not alive:
-            return
-        time.sleep(0.5)
+                logging.debug(f'Sending SIGTERM to existing hmonitors instance {pid}')
+                signal.pidfd_send_signal(pidfd, signal.SIGTERM)
+                poller.register(pidfd, select.EPOLLIN)
+            except ProcessLookupError:
+                os.close(pidfds.pop(pidfd))
+            except Exception:
+                logging.debug(f'Failed to send SIGTERM to {pid}')
+                os.close(pidfds.pop(pidfd))
+
+        # Wait up to 3 seconds for processes to exit, then SIGKILL any remaining
+        # A pidfd becomes readable when its process exits
+        alive = dict(pidfds)
+        deadline = time.monotonic() + 3
+        while alive:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            for pidfd, _ in poller.poll(timeout):
+                poller.unregister(pidfd)
+                alive.pop(pidfd, None)
 
-    for pid in alive:
-        try:
-            logging.debug(f'Sending SIGKILL to existing hmonitors instance {pid}')
-            os.kill(pid, signal.SIGKILL)
-        except Exception:
-            logging.debug(f'Failed to send SIGKILL to {pid}')
+        for pidfd, pid in alive.items():
+            try:
+                logging.debug(f'Sending SIGKILL to existing hmonitors instance {pid}')
+                signal.pidfd_send_signal(pidfd, signal.SIGKILL)
+            except Exception:
+                logging.debug(f'Failed to send SIGKILL to {pid}')
+    finally:
+        poller.close()
+        for pidfd in pidfds:
+            os.close(pidfd)
 
 def load_config(config_file):
     '''
     Load the configuration file
+    The parsed configuration is cached: the same object is returned
+    as long as the content of the file does not change
     :param config_file: path to the configuration file
     :type config_file: str
     :return: configuration file
     :rtype: dict
     '''
-    with open(config_file, 'r') as stream:
-        return yaml.safe_load(stream)
+    stat = os.stat(config_file)
+    cached = _CONFIG_CACHE.get(config_file)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[3]
+
+    with open(config_file, 'rb') as stream:
+        stat = os.fstat(stream.fileno())
+        data = stream.read()
+
+    # The file was written, but its content might be the same
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if cached and cached[2] == digest:
+        config = cached[3]
+    else:
+        config = yaml.load(data, Loader=_YAML_LOADER)
+
+    _CONFIG_CACHE[config_file] = (stat.st_mtime_ns, stat.st_size, digest, config)
+    return config
 
 def select_monitors(monitors, match):
     '''
@@ -252,11 +492,12 @@ def select_monitors(monitors, match):
     :rtype: list
     '''
     selected_monitor = []
+    # Each match element is a single key-value pair
+    criteria = [next(iter(match_element.items())) for match_element in match]
 
     for monitor in monitors:
         match_found = True
-        for match_element in match:
-            key, value = list(match_element.items())[0]
+        for key, value in criteria:
             if key not in monitor or monitor[key] != value:
                 match_found = False
                 break
@@ -279,159 +520,219 @@ def get_upmost_leftmost_monitor(monitors):
     :rtype: Monitor
     '''
     for monitor in monitors:
-        if monitors[monitor].position == 'auto':
+        if monitor.position == 'auto':
             continue
-        if not monitors[monitor].above and not monitors[monitor].left:
-            return monitors[monitor]
+        if monitor.above is None and monitor.left is None:
+            return monitor
 
-def set_position(monitors, monitor, position='0x0'):
+def set_position(monitors, root):
     '''
-    Set the position of the monitor relative to
-    another monitor in a recursive way.
+    Set the position of the monitors relative to
+    each other, starting from the root monitor.
     :param monitors: list of monitors
     :type monitors: list
-    :param monitor: monitor to set the position for
-    :type monitor: Monitor
-    :param position: position of the monitor
-    :type position: str
+    :param root: monitor placed at the origin
+    :type root: Monitor
     :return: None
     '''
-    monitor.position = position
-
-    # If the monitor has a monitor on the right, set the position of the right monitor
-    if monitor.right:
-        right_monitor = monitors[monitor.right]
-
-        next_position_x = int(monitor.resolution.split('x')[0])
-        if right_monitor.align == 'top':
-            next_position_y = int(position.split('x')[1])
-        elif right_monitor.align == 'bottom':
-            next_position_y = int(monitor.resolution.split('x')[1]) - int(right_monitor.resolution.split('x')[1])
-        else:
-            if right_monitor.align != 'center':
-                logging.error(f'Invalid align value for monitor {right_monitor.name}, using default center')
-            next_position_y = (int(monitor.resolution.split('x')[1]) - int(right_monitor.resolution.split('x')[1])) // 2
-
-        next_position = f'{next_position_x}x{next_position_y}'
+    # Depth-first traversal with an explicit stack, right monitors before below ones
+    # Each entry also holds the monitors on the path from the root, to detect cycles
+    stack = deque([(root, (0, 0), frozenset())])
+    while stack:
+        monitor, position, ancestors = stack.pop()
+        if id(monitor) in ancestors:
+            logging.error(f'Cyclic position configuration for monitor {monitor.name}')
+            sys.exit(1)
+        ancestors = ancestors | {id(monitor)}
+        monitor.set_position(position)
+        width, height = monitor._res
+
+        # If the monitor has a monitor below, set the position of the below monitor
+        if monitor.below is not None:
+            below_monitor = monitors[monitor.below]
+
+            if below_monitor.align == 'left':
+                next_position_x = position[0]
+            elif below_monitor.align == 'right':
+                next_position_x = width - below_monitor._res[0]
+            else:
+                if below_monitor.align != 'center':
+                    logging.error(f'Invalid align value for monitor {below_monitor.name}, using default center')
+                next_position_x = (width - below_monitor._res[0]) // 2
 
-        set_position(monitors, right_monitor, next_position)
+            next_position_y = height
 
-    # If the monitor has a monitor below, set the position of the below monitor
-    if monitor.below:
-        below_monitor = monitors[monitor.below]
+            stack.append((below_monitor, (next_position_x, next_position_y), ancestors))
 
-        if below_monitor.align == 'left':
-            next_position_x = int(position.split('x')[0])
-        elif below_monitor.align == 'right':
-            next_position_x = int(monitor.resolution.split('x')[0]) - int(below_monitor.resolution.split('x')[0])
-        else:
-            if below_monitor.align != 'center':
-                logging.error(f'Invalid align value for monitor {below_monitor.name}, using default center')
-            next_position_x = (int(monitor.resolution.split('x')[0]) - int(below_monitor.resolution.split('x')[0])) // 2
+        # If the monitor has a monitor on the right, set the position of the right monitor
+        # It is pushed last so that it is positioned first
+        if monitor.right is not None:
+            right_monitor = monitors[monitor.right]
 
-        next_position_y = int(monitor.resolution.split('x')[1])
-
-        next_position = f'{next_position_x}x{next_position_y}'
+            next_position_x = width
+            if right_monitor.align == 'top':
+                next_position_y = position[1]
+            elif right_monitor.align == 'bottom':
+                next_position_y = height - right_monitor._res[1]
+            else:
+                if right_monitor.align != 'center':
+                    logging.error(f'Invalid align value for monitor {right_monitor.name}, using default center')
+                next_position_y = (height - right_monitor._res[1]) // 2
 
-        set_position(monitors, below_monitor, next_position)
+            stack.append((right_monitor, (next_position_x, next_position_y), ancestors))
 
-    # No need for the above and left monitors since we start from the upmost leftmost monitor
+        # No need for the above and left monitors since we start from the upmost leftmost monitor
 
-def apply_configuration(monitor):
+def build_keyword(monitor):
     '''
-    Apply the configuration for the monitor
-    using hyprctl
-    :param monitor: monitor to apply the configuration for
+    Build the hyprctl keyword command for the monitor
+    :param monitor: monitor to build the command for
     :type monitor: Monitor
-    :return: None
+    :return: hyprctl keyword command
+    :rtype: str
     '''
-    command = f'hyprctl keyword monitor {monitor.id},{monitor.resolution},'
+    command = f'keyword monitor {monitor.id},{monitor.resolution},'
     command += f'{monitor.position},{monitor.scale}'
     if monitor.extra:
         command += f',{monitor.extra}'
+    return command
+
+async def apply_configuration(monitors):
+    '''
+    Apply the configuration for the monitors
+    using a single batched hyprctl call
+    :param monitors: monitors to apply the configuration for
+    :type monitors: list
+    :return: whether hyprctl applied the configuration successfully
+    :rtype: bool
+    '''
+    commands = [build_keyword(monitor) for monitor in monitors]
 
-    subprocess.run(shlex.split(command), capture_output=True, text=True)
-    logging.debug(f'Applied configuration for monitor {monitor.name} ({monitor.id}): {command}')
+    process = await asyncio.create_subprocess_exec('hyprctl', '--batch', ' ; '.join(commands), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    _, stderr = await process.communicate()
+    if process.returncode != 0 or stderr.strip():
+        logging.error(f'Failed to apply configuration with hyprctl: {stderr.decode(errors="replace").strip()}')
+        return False
+
+    for monitor, command in zip(monitors, commands):
+        logging.debug(f'Applied configuration for monitor {monitor.name} ({monitor.id}): {command}')
+    return True
 
 
 def send_notification(summary, title='Hmonitors'):
     '''
     Send a desktop notification using notify-send if available.
+    The notification is sent in the background, without waiting for notify-send.
     '''
     try:
         # Only attempt if notify-send is present on the system
-        if shutil.which('notify-send') is None:
+        if _NOTIFY_SEND is None:
             logging.debug('notify-send not found, skipping desktop notification')
             return
-        subprocess.run(['notify-send', title, summary], check=False)
+        subprocess.Popen([_NOTIFY_SEND, title, summary])
     except Exception:
         logging.debug('Failed to send notification', exc_info=True)
 
-def setup_monitors(config_file):
+def get_topology(hyprctl_monitors, config):
+    '''
+    Get a signature of the connected monitors, made of every
+    property that can be used to match them with the configuration
+    :param hyprctl_monitors: monitors from hyprctl
+    :type hyprctl_monitors: list
+    :param config: configuration
+    :type config: dict
+    :return: signature of the connected monitors
+    :rtype: tuple
+    '''
+    keys = set(TOPOLOGY_KEYS)
+    for monitor_config in config['monitors'].values():
+        for match_element in monitor_config.get('match', []):
+            keys.update(match_element)
+    keys = sorted(keys)
+
+    # The values are compared through repr, since they are not necessarily hashable or orderable
+    return tuple(sorted(repr([monitor.get(key) for key in keys]) for monitor in hyprctl_monitors))
+
+async def setup_monitors(config_file, hyprctl_monitors=None, force=False):
     '''
     Setup the monitors
+    Unless forced, nothing is done if neither the connected monitors
+    nor the configuration changed since the last setup
+    :param config_file: path to the configuration file
+    :type config_file: str
+    :param hyprctl_monitors: monitors from hyprctl, queried if not given
+    :type hyprctl_monitors: list
+    :param force: apply the configuration even if nothing changed
+    :type force: bool
     :return: None
     '''
+    global _LAST_TOPOLOGY, _LAST_CONFIG
+
     config = load_config(config_file)
 
-    hyprctl_monitors = get_monitors()
-    monitors = {}
+    if hyprctl_monitors is None:
+        hyprctl_monitors = await get_monitors()
+    topology = get_topology(hyprctl_monitors, config)
+    # load_config returns the same object as long as the file is unchanged
+    if not force and topology == _LAST_TOPOLOGY and config is _LAST_CONFIG:
+        logging.debug('Monitors and configuration unchanged, skipping setup')
+        return
+
+    # The monitors are stored in a list and refer to each other by index
+    monitors = []
+    indices = {}
+    matched = []
 
     # Match the monitors with the configuration
-    for monitor in config['monitors']:
-        if 'match' in config['monitors'][monitor]:
-            match = config['monitors'][monitor]['match']
-            selected_monitor = select_monitors(hyprctl_monitors, match)
+    for name, monitor_config in config['monitors'].items():
+        if 'match' in monitor_config:
+            selected_monitor = select_monitors(hyprctl_monitors, monitor_config['match'])
         else:
-            logging.error(f'No match found for {monitor}')
+            logging.error(f'No match found for {name}')
             sys.exit(1)
 
         if not selected_monitor:
-            logging.info(f'No monitor found for {monitor}')
+            logging.info(f'No monitor found for {name}')
             continue
 
         # Initialize the monitor
         # The name of the monitor from `hyprctl monitors` is used as the id
-        resolution = f'{selected_monitor["width"]}x{selected_monitor["height"]}'
-        monitors[monitor] = Monitor(selected_monitor['name'], monitor)
-        monitors[monitor].set_resolution(resolution)
-        if 'align' in config['monitors'][monitor]:
-            monitors[monitor].set_align(config['monitors'][monitor]['align'])
-
-    # Parse the configuration and organize the monitors
-    for monitor in config['monitors']:
-        if monitor not in monitors:
-            continue
+        monitor = Monitor(selected_monitor['name'], name)
+        monitor.set_resolution((selected_monitor['width'], selected_monitor['height']))
+        if 'align' in monitor_config:
+            monitor.set_align(monitor_config['align'])
 
-        monitor_config = config['monitors'][monitor]
+        indices[name] = len(monitors)
+        monitors.append(monitor)
+        matched.append((monitor, monitor_config))
 
+    # Parse the configuration and organize the monitors
+    for monitor, monitor_config in matched:
         if 'position' in monitor_config:
             position = monitor_config['position']
-            relative_to = position.split()[1]
-            if relative_to not in monitors:
+            relation, relative_to = position.split()[:2]
+            if relative_to not in indices:
                 logging.error(f'Monitor {relative_to} not found')
                 sys.exit(1)
+            index = indices[monitor.name]
+            relative_index = indices[relative_to]
+            relative = monitors[relative_index]
             # TODO: check for conflicts
-            if 'above' in position:
-                monitors[monitor].set_below(relative_to)
-                monitors[relative_to].set_above(monitor)
-            if 'below' in position:
-                monitors[monitor].set_above(relative_to)
-                monitors[relative_to].set_below(monitor)
-            if 'left-of' in position:
-                monitors[monitor].set_right(relative_to)
-                monitors[relative_to].set_left(monitor)
-            if 'right-of' in position:
-                monitors[monitor].set_left(relative_to)
-                monitors[relative_to].set_right(monitor)
-            if 'same-as' in position:
-                monitors[monitor].set_position('auto')
-                monitors[monitor].set_resolution('preferred')
-                monitors[monitor].set_scale('1')
-                monitors[monitor].set_extra(f'mirror,{monitors[relative_to].id}')
+            if relation in RELATIONS:
+                set_monitor, set_relative = RELATIONS[relation]
+                set_monitor(monitor, relative_index)
+                set_relative(relative, index)
+            elif relation == 'same-as':
+                monitor.set_position('auto')
+                monitor.set_resolution('preferred')
+                monitor.set_scale('1')
+                monitor.set_extra(f'mirror,{relative.id}')
+            else:
+                logging.error(f'Invalid position value {position} for monitor {monitor.name}')
+                sys.exit(1)
 
         if 'scale' in monitor_config:
-            monitors[monitor].set_scale(monitor_config['scale'])
+            monitor.set_scale(monitor_config['scale'])
 
     # We need to find the upmost and leftmost monitor
     upmost_leftmost_monitor = get_upmost_leftmost_monitor(monitors)
@@ -440,29 +741,37 @@ def setup_monitors(config_file):
     # Start from the upmost leftmost monitor
     set_position(monitors, upmost_leftmost_monitor)
 
+    # Monitors that are neither mirrored nor linked to the upmost leftmost monitor have no position
+    unplaced = [monitor.name for monitor in monitors if monitor.position is None]
+    if unplaced:
+        logging.error(f'Could not position monitors {", ".join(unplaced)}: they are not linked to monitor {upmost_leftmost_monitor.name}')
+        sys.exit(1)
+
     # Get the min x and y of the position of the monitors
-    min_x = min([int(monitors[monitor].position.split('x')[0]) for monitor in monitors if monitors[monitor].position != 'auto'])
-    min_y = min([int(monitors[monitor].position.split('x')[1]) for monitor in monitors if monitors[monitor].position != 'auto'])
+    positions = [monitor._pos for monitor in monitors if monitor._pos is not None]
+    min_x = min(x for x, _ in positions)
+    min_y = min(y for _, y in positions)
 
     # If one of the monitors has a negative position, we need to shift all the monitors
     # Since negative positions are not allowed
     # We potentially need to shift all the monitors to the right and down
-    if min_x < 0:
-        for monitor in monitors:
-            x = int(monitors[monitor].position.split('x')[0]) - min_x
-            y = int(monitors[monitor].position.split('x')[1])
-            monitors[monitor].position = f'{x}x{y}'
-    if min_y < 0:
+    shift_x = min(min_x, 0)
+    shift_y = min(min_y, 0)
+    if shift_x or shift_y:
         for monitor in monitors:
-            x = int(monitors[monitor].position.split('x')[0])
-            y = int(monitors[monitor].position.split('x')[1]) - min_y
-            monitors[monitor].position = f'{x}x{y}'
+            if monitor._pos is None:
+                continue
+            x, y = monitor._pos
+            monitor.set_position((x - shift_x, y - shift_y))
 
     # Apply the configuration
-    applied = []
-    for monitor in monitors:
-        apply_configuration(monitors[monitor])
-        applied.append(monitors[monitor].name)
+    applied = [monitor.name for monitor in monitors]
+    if applied and not await apply_configuration(monitors):
+        # The setup is not recorded, so that the next event retries it
+        return
+
+    _LAST_TOPOLOGY = topology
+    _LAST_CONFIG = config
 
     # Send a desktop notification summarizing the applied configuration
     if applied:
@@ -482,7 +791,11 @@ async def main():
         logging.basicConfig(level=logging.INFO, format='%(message)s')
 
     # Ensure only one instance runs at a time
-    kill_existing_instances()
+    # Query the monitors meanwhile, since it does not depend on the other instances
+    _, hyprctl_monitors = await asyncio.gather(
+        asyncio.to_thread(kill_existing_instances),
+        get_monitors(),
+    )
 
     config_file = os.path.expanduser(args.config)
     if not os.path.exists(config_file):
@@ -491,40 +804,56 @@ async def main():
 
     watch_enabled = args.watch or args.hook  # Enable watching if requested or when in hook mode
 
-    async def monitor_config_changes(config_path, poll_interval=1.0):
+    async def monitor_config_changes(config_path, debounce_interval=0.2):
         '''
-        Async polling watcher for the config file. When a change in mtime
-        is detected, call setup_monitors to apply the new configuration.
+        Async inotify watcher for the config file. When the file is written
+        or replaced, call setup_monitors to apply the new configuration.
+        Bursts of events are coalesced: the configuration is applied once no
+        new event has been received for debounce_interval seconds.
+        Writes that leave the content unchanged are ignored.
         '''
         try:
-            last_mtime = os.path.getmtime(config_path)
+            last_config = load_config(config_path)
         except Exception:
-            last_mtime = None
+            last_config = None
+        last_event = None
+        pending = set()
+
+        async def reapply(event_time):
+            nonlocal last_config
+            await asyncio.sleep(debounce_interval)
+            if event_time != last_event:
+                # A newer event arrived, it will take care of re-applying
+                return
 
-        while True:
-            await asyncio.sleep(poll_interval)
             try:
-                mtime = os.path.getmtime(config_path)
-            except Exception:
-                # The file might have been deleted or is temporarily unavailable
-                continue
-            if last_mtime is None:
-                last_mtime = mtime
-                continue
-            if mtime != last_mtime:
+                # load_config returns the same object as long as the content is unchanged
+                config = load_config(config_path)
+                if config is last_config:
+                    logging.debug(f'Config file {config_path} rewritten without changes, skipping')
+                    return
+                last_config = config
                 logging.info(f'Config file {config_path} changed, re-applying configuration')
-                try:
-                    # Run the (blocking) setup in a thread
-                    await asyncio.to_thread(setup_monitors, config_path)
-                except Exception as e:
-                    logging.error(f'Failed to re-apply configuration: {e}')
-                    logging.debug(traceback.format_exc())
-                last_mtime = mtime
+                await setup_monitors(config_path)
+            except OSError:
+                # The file might have been deleted or is temporarily unavailable
+                return
+            except Exception as e:
+                logging.error(f'Failed to re-apply configuration: {e}')
+                logging.debug(traceback.format_exc())
+
+        watcher = FileWatcher(config_path)
+        async for _ in watcher.start():
+            last_event = time.monotonic()
+            task = asyncio.create_task(reapply(last_event))
+            # Keep a reference to the task until it is done
+            pending.add(task)
+            task.add_done_callback(pending.discard)
 
     if args.hook:
         logging.info('Running in hook mode, listening to events')
         # Setup the monitors once
-        setup_monitors(config_file)
+        await setup_monitors(config_file, hyprctl_monitors)
 
         # Start the config watcher if requested
         watcher_task = None
@@ -534,11 +863,26 @@ async def main():
         # Listen to events concurrently with the watcher
         listener = EventListener()
 
+        async def monitor_added(data):
+            # Hyprland resets the layout of an added monitor, even if it was
+            # removed and added back before the configuration was checked
+            await setup_monitors(config_file, force=True)
+
+        async def monitor_removed(data):
+            await setup_monitors(config_file)
+
+        # Handlers of the events, called with the data of the event
+        handlers = {
+            b'monitoradded': monitor_added,
+            b'monitorremoved': monitor_removed,
+        }
+
         async def event_loop():
             async for event in listener.start():
-                if any(event_name in event for event_name in ['monitoradded', 'monitorremoved']):
-                    # Run the potentially blocking setup in a thread
-                    await asyncio.to_thread(setup_monitors, config_file)
+                name, _, data = event.partition(b'>>')
+                handler = handlers.get(name)
+                if handler:
+                    await handler(data)
 
         # Run both tasks and wait until they finish
         try:
@@ -550,7 +894,7 @@ async def main():
             pass
     else:
         # Non-hook mode: apply once, then optionally watch for changes
-        setup_monitors(config_file)
+        await setup_monitors(config_file, hyprctl_monitors)
         if watch_enabled:
             # Run watcher forever
             await monitor_config_changes(config_file)